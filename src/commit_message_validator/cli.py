@@ -25,9 +25,46 @@ from click_option_group import optgroup
 
 from .lint import sample
 from .lint import validate
+from .validators import GerritMessageValidator
+from .validators import GitHubMessageValidator
+from .validators import GitLabMessageValidator
 from .version import __version__
 
 
+def validator_options(f):
+    """Add the mutually exclusive validation standard options to a command."""
+    decorators = [
+        optgroup("Validation standard", cls=MutuallyExclusiveOptionGroup),
+        optgroup.option(
+            "--gerrit",
+            "validator",
+            help="Use Gerrit standard",
+            flag_value=GerritMessageValidator,
+            type=click.UNPROCESSED,
+            default=False,
+        ),
+        optgroup.option(
+            "--github",
+            "validator",
+            help="Use GitHub standard",
+            flag_value=GitHubMessageValidator,
+            type=click.UNPROCESSED,
+            default=False,
+        ),
+        optgroup.option(
+            "--gitlab",
+            "validator",
+            help="Use GitLab standard",
+            flag_value=GitLabMessageValidator,
+            type=click.UNPROCESSED,
+            default=False,
+        ),
+    ]
+    for decorator in reversed(decorators):
+        f = decorator(f)
+    return f
+
+
 @click.group(
     invoke_without_command=True,
     epilog="When no COMMAND is specified, we default to 'validate'",
@@ -66,28 +103,7 @@ def install_hook(ctx):
 
 
 @cli.command("validate", aliases=["lint"])
-@optgroup("Validation standard", cls=MutuallyExclusiveOptionGroup)
-@optgroup.option(
-    "--gerrit",
-    "validator",
-    help="Use Gerrit standard",
-    flag_value="GerritMessageValidator",
-    default=False,
-)
-@optgroup.option(
-    "--github",
-    "validator",
-    help="Use GitHub standard",
-    flag_value="GitHubMessageValidator",
-    default=False,
-)
-@optgroup.option(
-    "--gitlab",
-    "validator",
-    help="Use GitLab standard",
-    flag_value="GitLabMessageValidator",
-    default=False,
-)
+@validator_options
 @click.option(
     "-m",
     "--merge-target",
@@ -132,8 +148,9 @@ def validate_message(
     type=click.Path(exists=True, file_okay=False, resolve_path=True),
 )
 @click.argument("count", type=int, default=10)
+@validator_options
 @click.pass_context
-def sample_repo(ctx, repo, count):
+def sample_repo(ctx, repo, count, validator=None):
     """Sample commits in a repo to see if they pass validation.
 
     \b
@@ -141,7 +158,7 @@ def sample_repo(ctx, repo, count):
     COUNT is the number of commits to sample (default: 10).
     """
     click.echo(f"Checking the last {count} commits to {click.format_filename(repo)}")
-    ctx.exit(sample(repo, count))
+    ctx.exit(sample(repo, count, validator=validator))
 
 
 if __name__ == "__main__":
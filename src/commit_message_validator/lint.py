@@ -15,25 +15,38 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
-import io
+import functools
+import itertools
 import operator
 import os
+import re
 import sys
+import types
 
 from .utils import ansi_codes
 from .utils import check_output
 from .utils import commit_message_cleanup_strip
+from .utils import iter_output
 from .validators import GerritMessageValidator
 from .validators import GitHubMessageValidator
 from .validators import GitLabMessageValidator
 
 WIKIMEDIA_GERRIT_HOST = "gerrit.wikimedia.org"
 WIKIMEDIA_GITLAB_HOST = "gitlab.wikimedia.org"
+# Matches a "remote.<name>.url <url>" line from `git config --get-regex`
+RE_REMOTE_URL = re.compile(r"^remote\.([^.]+)\.url (.*)$", re.MULTILINE)
 GERRIT_CHECK_FAIL_MESSAGE_SUGGESTION = (
     "Please review "
     "<https://www.mediawiki.org/wiki/Gerrit/Commit_message_guidelines>"
     "\nand update your commit message accordingly"
 )
+_VALIDATOR_BY_NAME = types.MappingProxyType(
+    {
+        "GerritMessageValidator": GerritMessageValidator,
+        "GitHubMessageValidator": GitHubMessageValidator,
+        "GitLabMessageValidator": GitLabMessageValidator,
+    },
+)
 
 
 def guess_message_validator_class():
@@ -46,13 +59,26 @@ def guess_message_validator_class():
 
     :return: A class that implements `MessageValidator` class.
     """
+    return _guess_message_validator_class(os.getcwd())
+
+
+@functools.lru_cache(maxsize=None)
+def _guess_message_validator_class(repo):
+    """Guess the MessageValidator class for the repo at a given path.
+
+    Results are cached as the remotes of a repo are not expected to change
+    while we are running.
+    """
+    import subprocess
+
     result = None
-    if os.path.exists(".gitreview") and os.path.isfile(".gitreview"):
+    gitreview = os.path.join(repo, ".gitreview")
+    if os.path.isfile(gitreview):
         result = check_output(
             "git",
             "config",
             "-f",
-            ".gitreview",
+            gitreview,
             "--get",
             "gerrit.host",
         )
@@ -63,27 +89,32 @@ def guess_message_validator_class():
     if result and WIKIMEDIA_GITLAB_HOST in result:
         return GitLabMessageValidator
 
-    result = check_output(
-        "git",
-        "config",
-        "--get-regex",
-        "^remote.*.url$",
-    )
+    try:
+        result = check_output(
+            "git",
+            "-C",
+            repo,
+            "config",
+            "--get-regex",
+            # Only the remotes that are checked below
+            r"^remote\.(origin|wikimedia|gerrit)\.url$",
+        )
+    except subprocess.CalledProcessError:
+        # None of the remotes are configured
+        result = ""
 
-    remotes = {
-        label.split(".", maxsplit=2)[1]: url
-        for label, url in (line.split(" ", maxsplit=1) for line in result.splitlines())
-    }
+    remotes = dict(RE_REMOTE_URL.findall(result))
+    origin = remotes.get("origin", "")
 
     if WIKIMEDIA_GERRIT_HOST in {
         remotes.get("wikimedia"),
         remotes.get("gerrit"),
-        remotes.get("origin"),
+        origin,
     }:
         return GerritMessageValidator
-    elif WIKIMEDIA_GITLAB_HOST in remotes.get("origin"):
+    elif WIKIMEDIA_GITLAB_HOST in origin:
         return GitLabMessageValidator
-    elif "github.com" in remotes.get("origin"):
+    elif "github.com" in origin:
         return GitHubMessageValidator
     else:
         # If there's nothing match just use GerritMessageValidator
@@ -99,12 +130,27 @@ def lint_message(lines, cls):
     """
     validator = cls()
     errors = list(validator.validate(lines))
-    errors.sort(key=operator.attrgetter("rule_id"))
-    errors.sort(key=operator.attrgetter("lineno"))
+    errors.sort(key=operator.attrgetter("lineno", "rule_id"))
     return errors
 
 
-def check_message(lines, validator_cls=GerritMessageValidator, lead=""):
+def _format_errors(errors, lead="", color="", reset=""):
+    """Format a report of validation errors.
+
+    :param errors: List of :class:`ValidationFailure`
+    :param lead: Lead string for each line of output
+    :param color: ANSI escape sequence to start each line with
+    :param reset: ANSI escape sequence to end each line with
+    :return: Report text, one line per error after a header line
+    """
+    prefix = f"{lead}{color}- Line "
+    report = [f"{lead}{color}The following errors were found:{reset}"]
+    report.extend(f"{prefix}{err.lineno}: {err.message}{reset}" for err in errors)
+    report.append("")
+    return "\n".join(report)
+
+
+def check_message(lines, validator_cls=GerritMessageValidator, lead="", file=None):
     """
     Check a commit message to see if it has errors.
 
@@ -117,121 +163,173 @@ def check_message(lines, validator_cls=GerritMessageValidator, lead=""):
         A class that implements `MessageValidator` class,
         default to `GerritMessageValidator`.
     :param lead: Lead string for each line of output
+    :param file: File-like object to write output to, default to `sys.stdout`
     :return:
         An integer, used for exit code.
     """
+    if file is None:
+        file = sys.stdout
     errors = lint_message(lines, validator_cls)
     if errors:
-        color, reset = ansi_codes()
-        print(f"{lead}{color}The following errors were found:{reset}")
-        for err in errors:
-            print(f"{lead}{color}- Line {err.lineno}: {err.message}{reset}")
+        color, reset = ansi_codes(file)
+        file.write(_format_errors(errors, lead, color, reset))
         return 1
 
-    print(f"{lead}Commit message is formatted properly! Keep up the good work!")
+    print(
+        f"{lead}Commit message is formatted properly! Keep up the good work!",
+        file=file,
+    )
     return 0
 
 
-def validate_single_commit(ref, validator, prefix):
-    """Validate a single commit message."""
-    # Check if ref is a merge commit by looking for multiple parents.
-    parents = check_output("git", "log", "--format=%P", ref, "-n1").strip().split(" ")
-    if len(parents) > 1:
-        # Use the right-most parent
-        ref = parents[-1]
+def message_lines(message):
+    """Split a commit message as output by `git log --format=%B` into lines."""
+    lines = message.splitlines()
+    # last line is sometimes an empty line
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def iter_commit_messages(*args):
+    """Iterate over non-merge commits selected by `git log` arguments.
+
+    All messages are streamed from a single git call.
 
-    commit = check_output(
+    :param args: Revision range and limiting arguments for `git log`
+    :return: :class:`collections.abc.Generator[tuple[str, str]]` of
+        sha1 and message pairs
+    """
+    # Each record is "<sha1>\x1f<message>" and records are NUL terminated.
+    records = iter_output(
         "git",
         "log",
-        "--format=%B",
+        "-z",
+        "--format=%H%x1f%B",
         "--no-color",
-        ref,
-        "-n1",
+        "--no-merges",
+        *args,
+        sep="\0",
     )
-    lines = commit.splitlines()
-    # last line is sometimes an empty line
-    if len(lines) > 0 and not lines[-1]:
-        lines = lines[:-1]
+    for record in records:
+        sha1, _, message = record.partition("\x1f")
+        yield sha1, message
 
+
+def validate_single_commit(ref, validator, prefix, message=None, file=None):
+    """Validate a single commit message.
+
+    :param ref: Commit to validate
+    :param validator: Validator to use
+    :param prefix: Print the commit's sha1 and subject before the results
+    :param message: Message of the commit as output by `git log --format=%B`.
+        Fetched from git if not given.
+    :param file: File-like object to write output to, default to `sys.stdout`
+    """
+    if message is None:
+        # Fetch the parents and the message in one call, separated by \x1f.
+        parents, _, message = check_output(
+            "git",
+            "show",
+            "-s",
+            "--format=%P%x1f%B",
+            "--no-color",
+            ref,
+        ).partition("\x1f")
+        # Check if ref is a merge commit by looking for multiple parents.
+        if " " in parents:
+            # Use the right-most parent
+            ref = parents.rpartition(" ")[2]
+            message = check_output(
+                "git",
+                "show",
+                "-s",
+                "--format=%B",
+                "--no-color",
+                ref,
+            )
+
+    lines = message_lines(message)
     if prefix:
-        print(f"Linting {ref[:7]}: {lines[0]}")
-    return check_message(lines, validator, lead="  ")
+        print(f"Linting {ref[:7]}: {lines[0]}", file=file)
+    return check_message(lines, validator, lead="  ", file=file)
 
 
-def validate(start_ref="HEAD", end_ref="HEAD~1", msg_path=None, validator=None):
+def validate(
+    start_ref="HEAD",
+    end_ref="HEAD~1",
+    msg_path=None,
+    validator=None,
+    file=None,
+):
     """Validate one or more commit messages.
 
     :param start_ref: Commit to start validation from
     :param end_ref: Commit to end validation before
     :param msg_path: :class:`pathlib.Path` to file with commit-message to validate
     :param validator: Validator to use
+    :param file: File-like object to write output to, default to `sys.stdout`
     """
-    if validator and type(validator) is str:
-        validator = {
-            "GerritMessageValidator": GerritMessageValidator,
-            "GitHubMessageValidator": GitHubMessageValidator,
-            "GitLabMessageValidator": GitLabMessageValidator,
-        }.get(validator)
+    if isinstance(validator, str):
+        validator = _VALIDATOR_BY_NAME.get(validator)
     if validator is None:
         validator = guess_message_validator_class()
 
-    print("commit-message-validator")
-    print(f"Using {validator.__name__} to check the commit message")
+    print("commit-message-validator", file=file)
+    print(f"Using {validator.__name__} to check the commit message", file=file)
 
     exit_status = 0
     if msg_path:
         # Read from file rather than git repo
         with msg_path.open(encoding="utf-8") as f:
             lines = commit_message_cleanup_strip(
-                [line.rstrip() for line in f.readlines()],
+                [line.rstrip() for line in f],
             )
-            exit_status = check_message(lines, validator)
+            exit_status = check_message(lines, validator, file=file)
     else:
-        sha1s = check_output(
-            "git",
-            "log",
-            "--format=%H",
-            "--no-merges",
-            f"{end_ref}..{start_ref}",
-        ).splitlines()
-        multi = len(sha1s) > 1
-
-        for ref in sha1s:
-            exit_status |= validate_single_commit(ref, validator, multi)
+        commits = iter_commit_messages(f"{end_ref}..{start_ref}")
+        # Look ahead far enough to know if more than one commit is checked
+        first = list(itertools.islice(commits, 2))
+        multi = len(first) > 1
+
+        for ref, message in itertools.chain(first, commits):
+            exit_status |= validate_single_commit(
+                ref,
+                validator,
+                multi,
+                message,
+                file=file,
+            )
 
     if exit_status != 0 and validator is GerritMessageValidator:
-        color, reset = ansi_codes()
-        print(f"{color}{GERRIT_CHECK_FAIL_MESSAGE_SUGGESTION}{reset}")
+        color, reset = ansi_codes(file)
+        print(f"{color}{GERRIT_CHECK_FAIL_MESSAGE_SUGGESTION}{reset}", file=file)
 
     return exit_status
 
 
-def sample(repo, count):
-    """Sample commits from a given repo."""
-    os.chdir(repo)
-    sha1s = check_output(
-        "git",
-        "log",
-        "--format=%H",
-        "--no-merges",
-        f"-n{count}",
-    ).splitlines()
+def sample(repo, count, validator=None):
+    """Sample commits from a given repo.
 
+    :param repo: Path to the git repo to sample commits from
+    :param count: Number of commits to sample
+    :param validator: Validator to use, guessed from the repo if not given
+    """
+    os.chdir(repo)
+    if isinstance(validator, str):
+        validator = _VALIDATOR_BY_NAME.get(validator)
+    if validator is None:
+        validator = guess_message_validator_class()
+    color, reset = ansi_codes()
     good = 0
     bad = 0
-    for sha1 in sha1s:
-        saved_stdout = sys.stdout
-        try:
-            out = io.StringIO()
-            sys.stdout = out
-            exit_code = validate(sha1)
-            if exit_code != 0:
-                saved_stdout.write("Fail: " + sha1 + "\n")
-                saved_stdout.write(out.getvalue() + "\n")
-                bad += 1
-            else:
-                saved_stdout.write("Pass: " + sha1 + "\n")
-                good += 1
-        finally:
-            sys.stdout = saved_stdout
+    for sha1, message in iter_commit_messages(f"-n{count}"):
+        errors = lint_message(message_lines(message), validator)
+        if errors:
+            report = _format_errors(errors, color=color, reset=reset)
+            sys.stdout.write(f"Fail: {sha1}\n{report}\n")
+            bad += 1
+        else:
+            sys.stdout.write(f"Pass: {sha1}\n")
+            good += 1
     print(f"{bad/(bad+good):.2%} commits failed validation.")
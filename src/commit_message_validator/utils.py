@@ -15,16 +15,61 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
-import subprocess
+import codecs
+import functools
+import io
+import os
 import sys
 
 
 def check_output(*args):
     """Wrapper around subprocess to handle Python 3"""
-    return subprocess.check_output(args).decode("utf8")
+    # Imported on first use so that library callers which only lint
+    # message text do not pay for loading subprocess.
+    import subprocess
 
+    return subprocess.check_output(args, encoding="utf-8", errors="replace")
 
-def ansi_codes():
+
+def iter_output(*args, sep="\n"):
+    """Run a command and iterate over its output split on `sep`.
+
+    Records are yielded as the command produces them rather than after it
+    has exited, so callers can start work on the first record while the
+    rest are still being generated.
+
+    Closing the iterator before the output is exhausted terminates the
+    command. Raises CalledProcessError if the command exits with a non-zero
+    status.
+    """
+    import subprocess
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with subprocess.Popen(args, stdout=subprocess.PIPE) as proc:
+        try:
+            pending = ""
+            while True:
+                # read1() returns whatever is available instead of blocking
+                # until the buffer is full.
+                chunk = proc.stdout.read1(io.DEFAULT_BUFFER_SIZE)
+                text = pending + decoder.decode(chunk, final=not chunk)
+                *records, pending = text.split(sep)
+                yield from records
+                if not chunk:
+                    break
+            if pending:
+                yield pending
+        except GeneratorExit:
+            # The caller stopped iterating early. Stop the command rather
+            # than waiting for it to produce output that nobody will read.
+            proc.terminate()
+            raise
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+
+
+def ansi_codes(file=None):
     """Get ANSI escape sequences for coloring error output.
 
     Can be configured using .gitconfig settings to disable or change color
@@ -38,13 +83,39 @@ def ansi_codes():
 
     Change color:
         git config color.commit_message_validator.error yellow
+
+    Setting the NO_COLOR environment variable to a non-empty value also
+    disables color output (https://no-color.org/).
+
+    :param file: File-like object the output will be written to, default to
+        `sys.stdout`. Whether it is a tty is passed on to
+        `git config --get-colorbool`.
     """
-    stdout_is_tty = "true" if sys.stdout.isatty() else "false"
+    if os.environ.get("NO_COLOR"):
+        return "", ""
+
+    if file is None:
+        file = sys.stdout
+    stdout_is_tty = "true" if file.isatty() else "false"
+    return _ansi_codes(os.getcwd(), stdout_is_tty)
+
+
+@functools.lru_cache(maxsize=None)
+def _ansi_codes(repo, stdout_is_tty):
+    """Ask git for the ANSI escape sequences to use.
+
+    Results are cached per repo and tty state as the git config is not
+    expected to change while we are running.
+    """
+    import subprocess
+
     try:
         # Ask git if colors should be used
         # Raises CalledProcessError if disabled
         check_output(
             "git",
+            "-C",
+            repo,
             "config",
             "--get-colorbool",
             "color.commit_message_validator",
@@ -54,6 +125,8 @@ def ansi_codes():
         return (
             check_output(
                 "git",
+                "-C",
+                repo,
                 "config",
                 "--get-color",
                 "color.commit_message_validator.error",
@@ -74,19 +147,26 @@ def commit_message_cleanup_strip(lines):
     - Collapse consecutive empty lines
     """
 
-    def pop_matching(predicate, idx=-1):
-        while predicate(lines[idx]):
-            lines.pop(idx)
+    # Find the bounds of the message with index scans rather than popping
+    # from the front of the list, which is O(n) per pop.
+    start = 0
+    end = len(lines)
+
+    def trim_end(predicate):
+        nonlocal end
+        while end > start and predicate(lines[end - 1]):
+            end -= 1
 
-    pop_matching(lambda x: x == "", idx=0)  # Discard empty leading lines
-    pop_matching(lambda x: x == "")  # Discard empty trailing lines
-    pop_matching(lambda x: x.startswith("#"))  # Discard commentary
-    pop_matching(lambda x: x == "")  # Discard empty trailing lines
+    while start < end and lines[start] == "":  # Discard empty leading lines
+        start += 1
+    trim_end(lambda x: x == "")  # Discard empty trailing lines
+    trim_end(lambda x: x.startswith("#"))  # Discard commentary
+    trim_end(lambda x: x == "")  # Discard empty trailing lines
 
     # Strip trailing whitespace and consolidate consecutive empty lines
     prior_line = None
     cleaned = []
-    for line in lines:
+    for line in lines[start:end]:
         line = line.rstrip()
         if line != prior_line or prior_line != "":
             cleaned.append(line)
@@ -22,6 +22,9 @@ import dataclasses
 class ValidationFailure:
     """Notice of a validation failure."""
 
+    # Declared by hand as dataclass(slots=True) needs Python 3.10
+    __slots__ = ("rule_id", "lineno", "message")
+
     rule_id: str
     lineno: int
     message: str
@@ -74,8 +77,9 @@ class MessageValidator:
         :param lines: Commit message lines
         :return: :class:`collections.abc.Generator[ValidationFailure]`
         """
-        for lineno, line in enumerate(lines):
-            yield from self.check_line(lineno + 1, line)
+        check_line = self.check_line
+        for lineno, line in enumerate(lines, start=1):
+            yield from check_line(lineno, line)
 
         try:
             yield from self.check_global(lines)
@@ -17,17 +17,97 @@
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
 import dataclasses
 from enum import Enum
-import re
+import functools
+import string
 import typing
 
 from .core import MessageValidator
 from .core import ValidationFailure
 
-RE_CHERRYPICK = re.compile(r"^\(cherry picked from commit [0-9a-fA-F]{40}\)$")
-RE_TRAILER = re.compile(
-    r"^(?P<name>[a-z]\S+):(?P<ws>\s*)(?P<value>.*)$",
-    re.IGNORECASE,
-)
+CHERRY_PICK_PREFIX = "(cherry picked from commit "
+ASCII_LETTERS = frozenset(string.ascii_letters)
+LOWER_HEX_DIGITS = string.digits + "abcdef"
+
+
+@functools.lru_cache(maxsize=256)
+def parse_trailer(line):
+    """Split a "Name: value" trailer line into its parts.
+
+    Several rules look at each line, so results are cached to only parse
+    a line once.
+
+    :param line: line to parse
+    :return: ``(name, ws, value)`` tuple or ``None`` if the line is not
+        formatted like a trailer
+    """
+    if ":" not in line or line[:1] not in ASCII_LETTERS:
+        return None
+    # The name runs to the last colon of the first whitespace delimited token
+    token = line.split(None, 1)[0]
+    name, _, rest = token.rpartition(":")
+    if len(name) < 2:
+        return None
+    token_end = len(token)
+    rest += line[token_end:]
+    value = rest.lstrip()
+    ws_end = len(rest) - len(value)
+    return name, rest[:ws_end], value
+
+
+def is_cherry_pick(line):
+    """Check if a line is a "(cherry picked from commit <sha1>)" note."""
+    # Prefix (27 characters) + 40 character sha1 + closing parenthesis
+    return (
+        len(line) == 68
+        and line.startswith(CHERRY_PICK_PREFIX)
+        and line[-1] == ")"
+        and not line[27:67].lstrip(string.hexdigits)
+    )
+
+
+def is_task_id(value):
+    """Check if a trailer value is a single Phabricator task ID.
+
+    Two trailing spaces are allowed for GitLab markdown rendering (T351253).
+    """
+    if value.endswith("  "):
+        value = value[:-2]
+    task_number = value[1:]
+    # Stripping the digits leaves nothing behind if there are only digits
+    return (
+        value[:1] == "T" and task_number != "" and not task_number.lstrip(string.digits)
+    )
+
+
+def is_change_id(value):
+    """Check if a trailer value is a single Gerrit change id.
+
+    Two trailing spaces are allowed for GitLab markdown rendering (T351253).
+    """
+    if value.endswith("  "):
+        value = value[:-2]
+    return (
+        len(value) == 41 and value[0] == "I" and not value[1:].lstrip(LOWER_HEX_DIGITS)
+    )
+
+
+def is_url_only(line):
+    """Check if a line is only a URL.
+
+    That is an optional "<", an "http://" or "https://" scheme in any case
+    and then one or more non-whitespace characters (which may include a
+    closing ">").
+    """
+    rest = line[1:] if line[:1] == "<" else line
+    scheme = rest[:8].lower()
+    if scheme.startswith("http://"):
+        rest = rest[7:]
+    elif scheme == "https://":
+        rest = rest[8:]
+    else:
+        return False
+    # At least one character and no whitespace after the scheme
+    return rest.split(None, 1) == [rest]
 
 
 class MessageContext(Enum):
@@ -48,6 +128,9 @@ class Rule:
 class LineRule(Rule):
     """A validation rule for a single line of a commit message."""
 
+    # Only apply the rule to lines in this context (None for all lines)
+    ctx: typing.ClassVar[typing.Optional[MessageContext]] = None
+
     def validate(self, lineno, line, context):  # noqa: U100 Unused argument
         """Validate a line from a commit message."""
         raise NotImplementedError(
@@ -62,19 +145,23 @@ class LineLengthRule(LineRule):
 
     max_len: typing.ClassVar[int]
     msg = "Line exceeds max length ({0}>{1})"
-    ctx: typing.Optional[MessageContext] = None
 
     def validate(self, lineno, line, context):
         if self.ctx and context != self.ctx:
             return
         line_len = len(line)
-        if line_len > self.max_len:
+        # Short lines pass without needing to check for an exemption
+        if line_len > self.max_len and not self.is_exempt(line):
             yield ValidationFailure(
                 self.id,
                 lineno,
                 self.msg.format(line_len, self.max_len),
             )
 
+    def is_exempt(self, line):  # noqa: U100 Unused argument
+        """Is this line allowed to exceed max_len?"""
+        return False
+
 
 @dataclasses.dataclass
 class LineRegexNoMatchRule(LineRule):
@@ -100,24 +187,33 @@ class SubjectMaxLength(LineLengthRule):
     msg = "Subject must be <=80 characters"
     max_len = 80
 
-    RE_REVERT = re.compile(r'^Revert ".*"$')
+    REVERT_PREFIX = 'Revert "'
 
-    def validate(self, lineno, line, context):
-        if context != self.ctx:
-            return
-        if not self.RE_REVERT.match(line):
-            yield from super().validate(lineno, line, context)
+    def is_exempt(self, line):
+        """Is this line a subject like /^Revert ".*"$/?"""
+        return (
+            line.startswith(self.REVERT_PREFIX)
+            and line.endswith('"')
+            and len(line) > len(self.REVERT_PREFIX)
+        )
 
 
-class SubjectNoBugOrTask(LineRegexNoMatchRule):
+class SubjectNoBugOrTask(LineRule):
     """Do not allow 'bug' or a Phabricator task ID in subject."""
 
     id = "S2"
     name = "subject-no-bug-or-task"
     ctx = MessageContext.SUBJECT
-    regex = re.compile(r"^(bug|T?\d+)", re.IGNORECASE)
     msg = "Do not define bug in the subject"
 
+    def validate(self, lineno, line, context):
+        if context != self.ctx:
+            return
+        # Equivalent to /^(bug|T?\d+)/i without a trip through the regex engine
+        task = line[1:] if line[:1] in ("T", "t") else line
+        if line[:3].lower() == "bug" or task[:1].isdecimal():
+            yield ValidationFailure(self.id, lineno, self.msg)
+
 
 class BodyMaxLength(LineLengthRule):
     """No line >100 characters (unless it is only a URL)"""
@@ -127,13 +223,9 @@ class BodyMaxLength(LineLengthRule):
     ctx = MessageContext.BODY
     max_len = 100
 
-    RE_URL = re.compile(r"^<?https?://\S+>?$", re.IGNORECASE)
-
-    def validate(self, lineno, line, context):
-        if context != self.ctx:
-            return
-        if not self.RE_URL.match(line):
-            yield from super().validate(lineno, line, context)
+    def is_exempt(self, line):
+        """Is this line only a URL?"""
+        return is_url_only(line)
 
 
 class TrailerNoBlankLines(LineRule):
@@ -157,16 +249,19 @@ class TrailerInBody(LineRule):
     id = "F2"
     name = "trailer-in-body"
     ctx = MessageContext.BODY
-    expected: typing.Optional[typing.Sequence[str]] = None
+    expected: typing.Optional[typing.Collection[str]] = None
+
+    def __post_init__(self):
+        self._expected = frozenset(self.expected or ())
 
     def validate(self, lineno, line, context):
         if context != self.ctx:
             return
-        m = RE_TRAILER.match(line)
-        if m:
-            name = m.group("name")
+        trailer = parse_trailer(line)
+        if trailer:
+            name = trailer[0]
             normalized = name.lower()
-            if self.expected and normalized not in self.expected:
+            if self._expected and normalized not in self._expected:
                 return
             yield ValidationFailure(
                 self.id,
@@ -179,13 +274,11 @@ class TrailerLineRule(LineRule):
     """A validation rule for a commit message trailer line."""
 
     def validate(self, lineno, line, context):
-        m = RE_TRAILER.match(line)
-        if not m:
+        trailer = parse_trailer(line)
+        if not trailer:
             return
-        name = m.group("name")
+        name, ws, value = trailer
         normalized_name = name.lower()
-        ws = m.group("ws")
-        value = m.group("value")
         yield from self.validate_trailer(
             lineno,
             name,
@@ -205,6 +298,10 @@ class ExpectedTrailers(TrailerLineRule):
     expected: typing.Sequence[str]
     fixup: typing.Optional[typing.Dict[str, str]] = None
 
+    def __post_init__(self):
+        self._trailers = {trailer.lower(): trailer for trailer in self.expected}
+        self._supported = ", ".join(self._trailers.values())
+
     def validate_trailer(
         self,
         lineno,
@@ -214,24 +311,23 @@ class ExpectedTrailers(TrailerLineRule):
         value,  # noqa: U100 Unused argument
         context,
     ):
-        trailers = {trailer.lower(): trailer for trailer in self.expected}
-        if self.fixup and normalized_name in self.fixup:
+        if self.fixup:
             # Treat as the correct name for the rest of the checks
-            normalized_name = self.fixup[normalized_name]
+            normalized_name = self.fixup.get(normalized_name, normalized_name)
 
-        if normalized_name not in trailers.keys():
+        correct_name = self._trailers.get(normalized_name)
+        if correct_name is None:
             if context is MessageContext.TRAILER:
-                supported = ", ".join(trailers.values())
                 yield ValidationFailure(
                     self.id,
                     lineno,
-                    f"Unexpected trailer '{name}'. Supported trailers: {supported}",
+                    f"Unexpected trailer '{name}'. "
+                    f"Supported trailers: {self._supported}",
                 )
             else:
                 # Not a expected trailer, so skip additional checks
                 return
 
-        correct_name = trailers.get(normalized_name)
         if correct_name and correct_name != name:
             yield ValidationFailure(
                 "F4",
@@ -256,8 +352,6 @@ class PhabricatorTaskIdExpected(TrailerLineRule):
     names: typing.Sequence[str]
     fixup: typing.Optional[typing.Dict[str, str]] = None
 
-    RE_BUGID = re.compile(r"^T[0-9]+(  )?$")
-
     def validate_trailer(
         self,
         lineno,
@@ -267,10 +361,10 @@ class PhabricatorTaskIdExpected(TrailerLineRule):
         value,
         context,  # noqa: U100 Unused argument
     ):
-        if self.fixup and normalized_name in self.fixup:
+        if self.fixup:
             # Treat as the correct name for the rest of the checks
-            normalized_name = self.fixup[normalized_name]
-        if normalized_name == "bug" and not self.RE_BUGID.match(value):
+            normalized_name = self.fixup.get(normalized_name, normalized_name)
+        if normalized_name == "bug" and not is_task_id(value):
             yield ValidationFailure(
                 self.id,
                 lineno,
@@ -287,8 +381,6 @@ class ChangeIdExpected(TrailerLineRule):
     names: typing.Sequence[str]
     fixup: typing.Optional[typing.Dict[str, str]] = None
 
-    RE_CHANGEID = re.compile(r"^I[a-f0-9]{40}(  )?$")
-
     def validate_trailer(
         self,
         lineno,
@@ -298,10 +390,10 @@ class ChangeIdExpected(TrailerLineRule):
         value,
         context,  # noqa: U100 Unused argument
     ):
-        if self.fixup and normalized_name in self.fixup:
+        if self.fixup:
             # Treat as the correct name for the rest of the checks
-            normalized_name = self.fixup[normalized_name]
-        if normalized_name in self.names and not self.RE_CHANGEID.match(value):
+            normalized_name = self.fixup.get(normalized_name, normalized_name)
+        if normalized_name in self.names and not is_change_id(value):
             yield ValidationFailure(
                 self.id,
                 lineno,
@@ -315,13 +407,14 @@ class UnexpectedTrailerLine(LineRule):
 
     id = "F8"
     name = "unexpected-trailer-line"
+    ctx = MessageContext.TRAILER
 
     def validate(self, lineno, line, context):
-        if context is not MessageContext.TRAILER:
+        if context is not self.ctx:
             return
         if not line:
             return
-        if not RE_TRAILER.match(line) and not RE_CHERRYPICK.match(line):
+        if not parse_trailer(line) and not is_cherry_pick(line):
             yield ValidationFailure(
                 self.id,
                 lineno,
@@ -373,12 +466,12 @@ class CherryPickLast(CommitRule):
     name = "cherry-pick-last-line"
 
     def validate(self, lines):
-        last_line = len(lines) - 1
-        for lineno, line in enumerate(lines):
-            if RE_CHERRYPICK.match(line) and lineno != last_line:
+        last_line = len(lines)
+        for lineno, line in enumerate(lines, start=1):
+            if is_cherry_pick(line) and lineno != last_line:
                 yield ValidationFailure(
                     self.id,
-                    lineno + 1,
+                    lineno,
                     "Cherry pick line is not the last line",
                 )
 
@@ -389,28 +482,28 @@ class ChangeIdRequired(CommitRule):
 
     id = "C4"
     name = "change-id-required"
-    before: typing.Optional[typing.Sequence[str]] = None
+    before: typing.Optional[typing.Collection[str]] = None
 
     def validate(self, lines):
         changeid = False
-        for lineno, line in enumerate(lines):
-            m = RE_TRAILER.match(line)
-            if m:
-                normalized = m.group("name").lower()
+        for lineno, line in enumerate(lines, start=1):
+            trailer = parse_trailer(line)
+            if trailer:
+                name = trailer[0]
+                normalized = name.lower()
                 if normalized == "change-id":
                     if not changeid:
-                        changeid = lineno + 1
+                        changeid = lineno
                     else:
                         yield ValidationFailure(
                             self.id,
-                            lineno + 1,
+                            lineno,
                             f"Extra Change-Id found, first at {changeid}",
                         )
                 elif self.before and normalized in self.before and changeid:
-                    name = m.group("name")
                     yield ValidationFailure(
                         "C5",
-                        lineno + 1,
+                        lineno,
                         f"Expected '{name}:' to come before Change-Id on line "
                         f"{changeid}",
                     )
@@ -435,17 +528,37 @@ class RulesMessageValidator(MessageValidator):
         """
         self._line_rules = line_rules or []
         self._commit_rules = commit_rules or []
-        self._expected_trailers = expected_trailers or []
+        # Line rules that apply in each context, so that rules limited to
+        # another context are never called.
+        self._line_rules_by_context = {
+            context: [
+                rule
+                for rule in self._line_rules
+                if rule.ctx is None or rule.ctx is context
+            ]
+            for context in MessageContext
+        }
+        self._expected_trailers = frozenset(expected_trailers or ())
         self._message_context = None
         super().__init__()
 
     def validate(self, lines):
         self._lines = lines
-        yield from super().validate(lines)
+        # Same walk as MessageValidator.validate() with check_line() inlined
+        # to skip creating an extra generator for every line.
+        line_rules_by_context = self._line_rules_by_context
+        get_context = self.get_context
+        for idx, line in enumerate(lines):
+            context = get_context(idx, lines)
+            lineno = idx + 1
+            for rule in line_rules_by_context[context]:
+                yield from rule.validate(lineno, line, context)
+
+        yield from self.check_global(lines)
 
     def check_line(self, lineno, line):
         context = self.get_context(lineno - 1, self._lines)
-        for rule in self._line_rules:
+        for rule in self._line_rules_by_context[context]:
             yield from rule.validate(lineno, line, context)
 
     def check_global(self, lines):
@@ -459,31 +572,30 @@ class RulesMessageValidator(MessageValidator):
         :param lines: commit message lines
         :return: :class:`MessageContext`
         """
+        context = self._message_context
+        expected_trailers = self._expected_trailers
         if lineno == 0:
             # First line in the commit message is subject.
-            self._message_context = MessageContext.SUBJECT
-
-        elif not self._expected_trailers:
-            self._message_context = MessageContext.BODY
-
-        elif self._message_context is not MessageContext.TRAILER:
-            line = lines[lineno]
-            trailer_match = RE_TRAILER.match(line)
-            cherrypick_match = RE_CHERRYPICK.match(line)
-
-            if (
-                (
-                    trailer_match
-                    and trailer_match.group("name").lower() in self._expected_trailers
-                )
-                or cherrypick_match
-            ) and not lines[lineno - 1]:
-                # If the current line is a trailer ("Name: ..." formatted)
-                # or it's a cherry pick
-                # and the previous line is a blank line.
-                # Mark the current line until the end as TRAILER.
-                self._message_context = MessageContext.TRAILER
-            else:
-                self._message_context = MessageContext.BODY
-
-        return self._message_context
+            context = MessageContext.SUBJECT
+
+        elif not expected_trailers:
+            context = MessageContext.BODY
+
+        elif context is not MessageContext.TRAILER:
+            context = MessageContext.BODY
+            # Only a line following a blank line can start the trailers, so
+            # skip parsing the current line when the previous one has text.
+            if not lines[lineno - 1]:
+                line = lines[lineno]
+                trailer = parse_trailer(line)
+
+                if (
+                    trailer and trailer[0].lower() in expected_trailers
+                ) or is_cherry_pick(line):
+                    # If the current line is a trailer ("Name: ..." formatted)
+                    # or it's a cherry pick.
+                    # Mark the current line until the end as TRAILER.
+                    context = MessageContext.TRAILER
+
+        self._message_context = context
+        return context
@@ -49,14 +49,16 @@ EXPECTED_TRAILERS = [
     "Tested-by",
     "Thanks",
 ]
-NORMALIZED_EXPECTED_TRAILERS = [name.lower() for name in EXPECTED_TRAILERS]
+NORMALIZED_EXPECTED_TRAILERS = frozenset(name.lower() for name in EXPECTED_TRAILERS)
 
-BEFORE_CHANGE_ID = [
-    "bug",
-    "closes",
-    "fixes",
-    "task",
-]
+BEFORE_CHANGE_ID = frozenset(
+    (
+        "bug",
+        "closes",
+        "fixes",
+        "task",
+    ),
+)
 
 # Invalid trailer name to expected name mapping
 BAD_TRAILERS = {
@@ -76,7 +78,7 @@ class GerritMessageValidator(RulesMessageValidator):
                 SubjectNoBugOrTask(),
                 BodyMaxLength(),
                 TrailerInBody(
-                    expected=NORMALIZED_EXPECTED_TRAILERS + list(BAD_TRAILERS.keys()),
+                    expected=NORMALIZED_EXPECTED_TRAILERS.union(BAD_TRAILERS),
                 ),
                 TrailerNoBlankLines(),
                 ExpectedTrailers(EXPECTED_TRAILERS, fixup=BAD_TRAILERS),
@@ -104,7 +106,7 @@ class GitLabMessageValidator(RulesMessageValidator):
                 SubjectNoBugOrTask(),
                 BodyMaxLength(),
                 TrailerInBody(
-                    expected=NORMALIZED_EXPECTED_TRAILERS + list(BAD_TRAILERS.keys()),
+                    expected=NORMALIZED_EXPECTED_TRAILERS.union(BAD_TRAILERS),
                 ),
                 TrailerNoBlankLines(),
                 ExpectedTrailers(EXPECTED_TRAILERS, fixup=BAD_TRAILERS),
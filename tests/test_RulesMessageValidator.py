@@ -17,6 +17,8 @@
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
 from commit_message_validator.validators import RulesMessageValidator
 from commit_message_validator.validators.rules import MessageContext
+from commit_message_validator.validators.rules import is_url_only
+from commit_message_validator.validators.rules import parse_trailer
 
 
 def test_get_context():
@@ -40,3 +42,26 @@ def test_get_context():
 
     result = [validator.get_context(lineno, lines) for lineno in range(len(lines))]
     assert result == expected_result
+
+
+def test_parse_trailer():
+    assert parse_trailer("Bug: T123") == ("Bug", " ", "T123")
+    assert parse_trailer("Change-Id:\tI00d0f7c3") == ("Change-Id", "\t", "I00d0f7c3")
+    assert parse_trailer("Depends-On:") == ("Depends-On", "", "")
+    assert parse_trailer("See:also: this") == ("See:also", " ", "this")
+    assert parse_trailer("See https://example.org") is None
+    assert parse_trailer("B: too short") is None
+    assert parse_trailer("1x: not a name") is None
+    assert parse_trailer("") is None
+
+
+def test_is_url_only():
+    assert is_url_only("https://example.org/a/very/long/path")
+    assert is_url_only("HTTP://example.org")
+    assert is_url_only("<https://example.org>")
+    assert is_url_only("https://>")
+    assert not is_url_only("https://")
+    assert not is_url_only("See https://example.org")
+    assert not is_url_only("https://example.org and more")
+    assert not is_url_only("ftp://example.org")
+    assert not is_url_only("")
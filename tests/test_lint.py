@@ -15,12 +15,8 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
-import contextlib
-import io
 import os
 import pathlib
-import re
-import sys
 
 import pytest
 
@@ -36,21 +32,12 @@ MESSAGE_VALIDATOR_MAP = {
     "GitHubMessageValidator": GitHubMessageValidator,
     "GitLabMessageValidator": GitLabMessageValidator,
 }
-# Regular expression for matching ANSI escape sequences
-# https://stackoverflow.com/a/14693789/8171
-RE_ESC = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
 
 
-@contextlib.contextmanager
-def capture_stdout():
-    """Context manager for capturing stdout."""
-    saved_stdout = sys.stdout
-    try:
-        out = io.StringIO()
-        sys.stdout = out
-        yield out
-    finally:
-        sys.stdout = saved_stdout
+@pytest.fixture(autouse=True)
+def _no_color(monkeypatch):
+    """Disable ANSI color codes so output can be compared as plain text."""
+    monkeypatch.setenv("NO_COLOR", "1")
 
 
 def generate_tests():
@@ -70,6 +57,7 @@ def generate_tests():
         "data",
     )
     trailers_string = ", ".join(trailer for trailer in EXPECTED_TRAILERS)
+    expected_outputs = {}
     for message_validator_name in os.listdir(base_path):
         if message_validator_name not in MESSAGE_VALIDATOR_MAP:
             continue
@@ -79,70 +67,73 @@ def generate_tests():
             message_validator_name,
         )
 
-        for fn in os.listdir(specific_message_validator_test_path):
-            test, _, extension = fn.rpartition(".")
+        with os.scandir(specific_message_validator_test_path) as it:
+            filenames = {entry.name for entry in it if entry.is_file()}
+
+        for filename in sorted(filenames):
+            test, _, extension = filename.rpartition(".")
+            if extension != "msg":
+                continue
+
             fn = os.path.join(specific_message_validator_test_path, test)
-            if extension == "msg":
-                exit_code = 0 if fn.endswith("ok") else 1
-                with open(fn + ".msg") as msg:
-                    out_fn = fn + ".out"
-                    if not os.path.isfile(out_fn):
-                        if exit_code == 0:
-                            out_fn = os.path.join(
-                                specific_message_validator_test_path,
-                                "ok.out",
-                            )
-                        else:
-                            pytest.fail(
-                                "No .out file found for {}.msg".format(
-                                    os.path.relpath(fn, base_path),
-                                ),
-                            )
-                    with open(out_fn) as out:
-                        # FIXME: trailers_string is a gross hack now
-                        out_text = out.read().replace(
-                            "%known_gerrit_trailers%",
-                            trailers_string,
-                        )
-                        yield pytest.param(
-                            msg.read(),
-                            out_text,
-                            exit_code,
-                            message_validator_name,
-                            id=os.path.relpath(fn, base_path),
-                        )
+            exit_code = 0 if test.endswith("ok") else 1
+            out_fn = fn + ".out"
+            if test + ".out" not in filenames:
+                if exit_code == 0:
+                    out_fn = os.path.join(
+                        specific_message_validator_test_path,
+                        "ok.out",
+                    )
+                else:
+                    pytest.fail(
+                        "No .out file found for {}.msg".format(
+                            os.path.relpath(fn, base_path),
+                        ),
+                    )
+
+            with open(fn + ".msg") as msg:
+                msg_lines = msg.read().splitlines()
+
+            # The shared ok.out is only read once per validator
+            if out_fn not in expected_outputs:
+                with open(out_fn) as out:
+                    # FIXME: trailers_string is a gross hack now
+                    expected_outputs[out_fn] = out.read().replace(
+                        "%known_gerrit_trailers%",
+                        trailers_string,
+                    )
+
+            yield pytest.param(
+                msg_lines,
+                expected_outputs[out_fn],
+                exit_code,
+                MESSAGE_VALIDATOR_MAP[message_validator_name],
+                id=os.path.relpath(fn, base_path),
+            )
 
 
 @pytest.mark.parametrize(
-    ("msg", "expected", "expected_exit_code", "message_validator_name"),
+    ("msg_lines", "expected", "expected_exit_code", "validator_cls"),
     generate_tests(),
 )
 def test_validator(
-    msg,
+    msg_lines,
     expected,
     expected_exit_code,
-    message_validator_name,
+    validator_cls,
+    capsys,
 ):
-    with capture_stdout() as out:
-        exit_code = check_message(
-            msg.splitlines(),
-            MESSAGE_VALIDATOR_MAP[message_validator_name],
-        )
-        # Ignore ANSI escapes in output
-        plain_out = RE_ESC.sub("", out.getvalue())
-        assert plain_out == expected
-        assert exit_code == expected_exit_code
+    exit_code = check_message(msg_lines, validator_cls)
+    assert capsys.readouterr().out == expected
+    assert exit_code == expected_exit_code
 
 
-def test_validate_with_msg_path():
+def test_validate_with_msg_path(capsys):
     msg_path = pathlib.Path(__file__).parent / "data" / "T357188"
-    with capture_stdout() as out:
-        exit_code = validate(msg_path=msg_path, validator=GitLabMessageValidator)
-        # Ignore ANSI escapes in output
-        plain_out = RE_ESC.sub("", out.getvalue())
-        assert (
-            plain_out == "commit-message-validator\n"
-            "Using GitLabMessageValidator to check the commit message\n"
-            "Commit message is formatted properly! Keep up the good work!\n"
-        )
-        assert exit_code == 0
+    exit_code = validate(msg_path=msg_path, validator=GitLabMessageValidator)
+    assert (
+        capsys.readouterr().out == "commit-message-validator\n"
+        "Using GitLabMessageValidator to check the commit message\n"
+        "Commit message is formatted properly! Keep up the good work!\n"
+    )
+    assert exit_code == 0
@@ -15,7 +15,15 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # Commit Message Validator.  If not, see <http://www.gnu.org/licenses/>.
+import subprocess
+import sys
+import time
+
+import pytest
+
+from commit_message_validator.utils import ansi_codes
 from commit_message_validator.utils import commit_message_cleanup_strip
+from commit_message_validator.utils import iter_output
 
 
 def test_commit_message_cleanup_strip():
@@ -46,3 +54,38 @@ def test_commit_message_cleanup_strip():
     result = commit_message_cleanup_strip(lines)
     print(result)
     assert result == expected_result
+
+
+def test_ansi_codes_no_color(monkeypatch):
+    monkeypatch.setenv("NO_COLOR", "1")
+    assert ansi_codes() == ("", "")
+
+
+def test_iter_output():
+    script = "import sys; sys.stdout.write('a\\0b\\nc\\0' * 3000)"
+    records = list(iter_output(sys.executable, "-c", script, sep="\0"))
+    assert records == ["a", "b\nc"] * 3000
+
+
+def test_iter_output_failure():
+    with pytest.raises(subprocess.CalledProcessError):
+        list(iter_output(sys.executable, "-c", "raise SystemExit(3)"))
+
+
+def test_iter_output_close_terminates():
+    script = "import time; print('a', flush=True); time.sleep(60)"
+    records = iter_output(sys.executable, "-c", script)
+    assert next(records) == "a"
+    start = time.monotonic()
+    records.close()
+    # close() must terminate the child instead of waiting for it to exit
+    assert time.monotonic() - start < 10
+
+
+def test_commit_message_cleanup_strip_empty():
+    assert commit_message_cleanup_strip(["", "# Commentary", ""]) == []
+
+
+def test_iter_output_invalid_utf8():
+    script = "import sys; sys.stdout.buffer.write(b'caf\\xe9\\n')"
+    assert list(iter_output(sys.executable, "-c", script)) == ["caf\ufffd"]